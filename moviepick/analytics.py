@@ -0,0 +1,158 @@
+import functools
+import threading
+import time
+from typing import Callable, TypeVar, Iterable
+
+from loguru import logger
+from pymongo.synchronous.collection import Collection
+
+from models import Media, AgreementStats, ScoreStats, ReporterStats, WatchTimeStats
+from settings import MongoSettings
+from utils import get_mongo_db, get_mongo_collection, on_backlog_write
+
+T = TypeVar('T')
+
+# Writes made by another process (e.g. the API vs the Streamlit app) do not reach our hooks, the TTL bounds staleness.
+CACHE_TTL = 300
+
+_cache: dict[str, tuple[float, list]] = {}
+_cache_generation = 0
+_cache_lock = threading.Lock()
+
+AGREEMENT_PIPELINE = [
+    {'$project': {'votes': {'$filter': {'input': '$votes', 'cond': {'$ne': ['$$this.value', None]}}}}},
+    {'$addFields': {'others': '$votes'}},
+    {'$unwind': '$votes'},
+    {'$unwind': '$others'},
+    {'$match': {'$expr': {'$lt': ['$votes.user', '$others.user']}}},
+    {'$group': {'_id': {'first': '$votes.user', 'second': '$others.user'},
+                'shared_votes': {'$sum': 1},
+                'agreements': {'$sum': {'$cond': [{'$eq': ['$votes.value', '$others.value']}, 1, 0]}}}},
+    {'$project': {'_id': 0,
+                  'first': '$_id.first',
+                  'second': '$_id.second',
+                  'shared_votes': 1,
+                  'agreements': 1,
+                  'agreement': {'$divide': ['$agreements', '$shared_votes']}}},
+    {'$sort': {'agreement': -1, 'first': 1, 'second': 1}},
+]
+
+REPORTER_PIPELINE = [
+    {'$group': {'_id': '$reporter',
+                'proposals': {'$sum': 1},
+                'viewed': {'$sum': {'$cond': [{'$eq': ['$viewed', True]}, 1, 0]}}}},
+    {'$project': {'_id': 0,
+                  'reporter': '$_id',
+                  'proposals': 1,
+                  'viewed': 1,
+                  'acceptance_rate': {'$divide': ['$viewed', '$proposals']}}},
+    {'$sort': {'acceptance_rate': -1, 'reporter': 1}},
+]
+
+WATCH_TIME_PIPELINE = [
+    {'$match': {'viewed_on': {'$ne': None}}},
+    {'$project': {'subtype': 1,
+                  'days_to_watch': {'$dateDiff': {'startDate': {'$toDate': '$_id'},
+                                                  'endDate': {'$toDate': '$viewed_on'},
+                                                  'unit': 'day'}},
+                  'schedule_delay': {'$cond': [{'$ifNull': ['$scheduled_on', False]},
+                                               {'$dateDiff': {'startDate': {'$toDate': '$scheduled_on'},
+                                                              'endDate': {'$toDate': '$viewed_on'},
+                                                              'unit': 'day'}},
+                                               None]}}},
+    {'$group': {'_id': '$subtype',
+                'viewed': {'$sum': 1},
+                'days_to_watch_avg': {'$avg': '$days_to_watch'},
+                'schedule_delay_avg': {'$avg': '$schedule_delay'}}},
+    {'$project': {'_id': 0,
+                  'subtype': '$_id',
+                  'viewed': 1,
+                  'days_to_watch_avg': 1,
+                  'schedule_delay_avg': 1}},
+    {'$sort': {'subtype': 1}},
+]
+
+
+def score_pipeline(group_by: str) -> list[dict]:
+    return [
+        {'$unwind': '$votes'},
+        {'$match': {'votes.value': {'$ne': None}}},
+        {'$group': {'_id': f'${group_by}',
+                    'votes': {'$sum': 1},
+                    'score_avg': {'$avg': '$votes.value'}}},
+        {'$project': {'_id': 0,
+                      'group': '$_id',
+                      'votes': 1,
+                      'score_avg': 1}},
+        {'$sort': {'score_avg': -1, 'group': 1}},
+    ]
+
+
+@on_backlog_write
+def invalidate_cache(medias: Iterable[Media] = ()):
+    global _cache_generation
+
+    with _cache_lock:
+        _cache.clear()
+        _cache_generation += 1
+
+
+def cached(func: Callable[[], list[T]]) -> Callable[[], list[T]]:
+    @functools.wraps(func)
+    def wrapper() -> list[T]:
+        with _cache_lock:
+            entry = _cache.get(func.__name__)
+            generation = _cache_generation
+
+        if entry is not None and time.monotonic() - entry[0] < CACHE_TTL:
+            return entry[1]
+
+        result = func()
+
+        with _cache_lock:
+            # A write landed while aggregating: the result may already be stale, so don't keep it
+            if generation == _cache_generation:
+                _cache[func.__name__] = (time.monotonic(), result)
+
+        return result
+
+    return wrapper
+
+
+def get_backlog_collection() -> Collection:
+    db = get_mongo_db(connection_string=MongoSettings().CONNECTION_STRING, db_name=MongoSettings().DATABASE)
+    collection = get_mongo_collection(db=db, collection_name=MongoSettings().BACKLOG_COLLECTION)
+
+    return collection
+
+
+def aggregate(pipeline: list[dict]) -> list[dict]:
+    logger.debug(f'Running aggregation pipeline with {len(pipeline)} stages...')
+    collection = get_backlog_collection()
+
+    return list(collection.aggregate(pipeline))
+
+
+@cached
+def get_agreement_stats() -> list[AgreementStats]:
+    return [AgreementStats(**raw) for raw in aggregate(AGREEMENT_PIPELINE)]
+
+
+@cached
+def get_subtype_score_stats() -> list[ScoreStats]:
+    return [ScoreStats(**raw) for raw in aggregate(score_pipeline(group_by='subtype'))]
+
+
+@cached
+def get_reporter_score_stats() -> list[ScoreStats]:
+    return [ScoreStats(**raw) for raw in aggregate(score_pipeline(group_by='reporter'))]
+
+
+@cached
+def get_reporter_stats() -> list[ReporterStats]:
+    return [ReporterStats(**raw) for raw in aggregate(REPORTER_PIPELINE)]
+
+
+@cached
+def get_watch_time_stats() -> list[WatchTimeStats]:
+    return [WatchTimeStats(**raw) for raw in aggregate(WATCH_TIME_PIPELINE)]
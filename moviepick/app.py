@@ -1,4 +1,38 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
+
+from analytics import get_agreement_stats, get_subtype_score_stats, get_reporter_score_stats, get_reporter_stats, \
+    get_watch_time_stats
+from models import AgreementStats, ScoreStats, ReporterStats, WatchTimeStats, Recommendation
+from recommender import recommend
 
 app = FastAPI()
 
+
+@app.get('/analytics/agreement', response_model=list[AgreementStats])
+def agreement_stats():
+    return get_agreement_stats()
+
+
+@app.get('/analytics/scores/subtype', response_model=list[ScoreStats])
+def subtype_score_stats():
+    return get_subtype_score_stats()
+
+
+@app.get('/analytics/scores/reporter', response_model=list[ScoreStats])
+def reporter_score_stats():
+    return get_reporter_score_stats()
+
+
+@app.get('/analytics/reporters', response_model=list[ReporterStats])
+def reporter_stats():
+    return get_reporter_stats()
+
+
+@app.get('/analytics/watch-time', response_model=list[WatchTimeStats])
+def watch_time_stats():
+    return get_watch_time_stats()
+
+
+@app.get('/recommendations', response_model=list[Recommendation])
+def recommendations(k: int = Query(default=10, ge=1, le=100)):
+    return recommend(k=k)
@@ -0,0 +1,385 @@
+"""
+Offline TMDB catalog built from the daily ID exports (https://developer.themoviedb.org/docs/daily-id-exports).
+
+Every export is turned into a directory of flat files that are memory mapped on search:
+
+- titles.bin/title_offsets.npy: normalized titles, sorted, for prefix search by binary search
+- names.bin/name_offsets.npy, ids.npy, popularity.npy: original title, TMDB id and popularity, aligned with titles
+- tokens.bin/token_offsets.npy, posting_offsets.npy/postings.npy: sorted title words with the rows containing them,
+  most popular first, used to collect fuzzy match candidates
+
+The exports only carry original titles, so the catalog finds TMDB ids: localized names, posters and metadata still come
+from TMDB once an entry is chosen (see utils.get_media_details).
+
+A small pointer file names the current export directory, so a refresh never touches files an open index is reading.
+
+    CATALOG_PATH=catalog python catalog.py refresh
+"""
+import argparse
+import difflib
+import gzip
+import heapq
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unicodedata
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterable, Literal, Optional
+
+import numpy as np
+import requests
+from loguru import logger
+
+from models import CatalogEntry
+from settings import CatalogSettings
+
+EXPORT_URL = 'http://files.tmdb.org/p/exports/{kind}_ids_{day:%m_%d_%Y}.json.gz'
+EXPORT_KINDS = {'movie': 'movie', 'tv': 'tv_series'}
+
+# Fuzzy candidates are the rows containing a query word, or a word close to it sharing its first letters
+FUZZY_PREFIX = 3
+FUZZY_TOKENS = 200
+FUZZY_POSTINGS = 200
+FUZZY_NEIGHBOUR_POSTINGS = 20
+MAX_CANDIDATES = 500
+# Candidates less similar than this are dropped, the cheap upper bounds of difflib skip most of them
+MIN_SIMILARITY = 0.6
+# Below this similarity, or for shorter queries, a match is not trusted enough to skip the TMDB search
+CONFIDENT_SIMILARITY = 0.9
+CONFIDENT_QUERY_LENGTH = 4
+POPULARITY_WEIGHT = 0.05
+
+
+def normalize(title: str) -> str:
+    title = unicodedata.normalize('NFKD', title.casefold())
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+
+    return ' '.join(re.split(r'\W+', title)).strip()
+
+
+def write_strings(path: Path, strings: Iterable[str]) -> np.ndarray:
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+
+    path.write_bytes(b''.join(encoded))
+
+    return offsets
+
+
+def read_strings(path: Path) -> np.ndarray:
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def build_index(export_path: Path, directory: Path):
+    """Build the index files of a gzipped export, one JSON object per line."""
+    names, ids, popularity = [], [], []
+
+    with gzip.open(export_path, mode='rt', encoding='utf-8') as export:
+        for line in export:
+            raw = json.loads(line)
+
+            if raw.get('adult'):
+                continue
+
+            name = raw.get('original_title') or raw.get('original_name')
+            if not name or not normalize(name):
+                continue
+
+            names.append(name)
+            ids.append(raw['id'])
+            popularity.append(raw.get('popularity') or 0.0)
+
+    titles = [normalize(name) for name in names]
+    order = sorted(range(len(titles)), key=titles.__getitem__)
+
+    np.save(directory / 'title_offsets.npy', write_strings(directory / 'titles.bin', (titles[i] for i in order)))
+    np.save(directory / 'name_offsets.npy', write_strings(directory / 'names.bin', (names[i] for i in order)))
+    np.save(directory / 'ids.npy', np.array(ids, dtype=np.uint32)[order])
+    sorted_popularity = np.array(popularity, dtype=np.float32)[order]
+    np.save(directory / 'popularity.npy', sorted_popularity)
+
+    postings = {}
+    for row, idx in enumerate(order):
+        for token in set(titles[idx].split()):
+            postings.setdefault(token, []).append(row)
+
+    tokens = sorted(postings)
+    np.save(directory / 'token_offsets.npy', write_strings(directory / 'tokens.bin', tokens))
+
+    posting_offsets = np.zeros(len(tokens) + 1, dtype=np.uint64)
+    np.cumsum([len(postings[t]) for t in tokens], out=posting_offsets[1:])
+    np.save(directory / 'posting_offsets.npy', posting_offsets)
+
+    rows = [np.array(postings[t], dtype=np.uint32) for t in tokens]
+    rows = [r[np.argsort(-sorted_popularity[r], kind='stable')] for r in rows]
+    np.save(directory / 'postings.npy', np.concatenate(rows) if rows else np.zeros(0, dtype=np.uint32))
+
+    logger.debug(f'Indexed {len(titles)} titles and {len(tokens)} words from {export_path.name}')
+
+
+class CatalogIndex:
+    def __init__(self, directory: Path, type: Literal['movie', 'tv']):
+        self.directory = directory
+        self.type = type
+
+        self._titles = read_strings(directory / 'titles.bin')
+        self._title_offsets = np.load(directory / 'title_offsets.npy', mmap_mode='r')
+        self._names = read_strings(directory / 'names.bin')
+        self._name_offsets = np.load(directory / 'name_offsets.npy', mmap_mode='r')
+        self._ids = np.load(directory / 'ids.npy', mmap_mode='r')
+        self._popularity = np.load(directory / 'popularity.npy', mmap_mode='r')
+        self._tokens = read_strings(directory / 'tokens.bin')
+        self._token_offsets = np.load(directory / 'token_offsets.npy', mmap_mode='r')
+        self._posting_offsets = np.load(directory / 'posting_offsets.npy', mmap_mode='r')
+        self._postings = np.load(directory / 'postings.npy', mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _string(data: np.ndarray, offsets: np.ndarray, idx: int) -> bytes:
+        return data[int(offsets[idx]):int(offsets[idx + 1])].tobytes()
+
+    @classmethod
+    def _lower_bound(cls, data: np.ndarray, offsets: np.ndarray, key: bytes) -> int:
+        lo, hi = 0, len(offsets) - 1
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cls._string(data, offsets, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    @classmethod
+    def _prefix_range(cls, data: np.ndarray, offsets: np.ndarray, prefix: str) -> tuple[int, int]:
+        key = prefix.encode('utf-8')
+
+        # 0xff never appears in UTF-8, so it sorts after every string starting with the prefix
+        return cls._lower_bound(data, offsets, key), cls._lower_bound(data, offsets, key + b'\xff')
+
+    def _most_popular(self, lo: int, hi: int, limit: int) -> np.ndarray:
+        rows = np.arange(lo, hi)
+
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-self._popularity[lo:hi], limit - 1)[:limit]]
+
+        return rows
+
+    def _entry(self, row: int, similarity: float = 1.0) -> CatalogEntry:
+        return CatalogEntry(id=int(self._ids[row]),
+                            name=self._string(self._names, self._name_offsets, row).decode('utf-8'),
+                            popularity=float(self._popularity[row]),
+                            type=self.type,
+                            similarity=similarity)
+
+    def _postings_of(self, token: int, limit: int) -> list[int]:
+        start = int(self._posting_offsets[token])
+        end = min(int(self._posting_offsets[token + 1]), start + limit)
+
+        return self._postings[start:end].tolist()
+
+    def search_prefix(self, query: str, limit: int = 20) -> list[CatalogEntry]:
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        lo, hi = self._prefix_range(self._titles, self._title_offsets, normalized)
+        rows = self._most_popular(lo, hi, limit)
+        rows = rows[np.argsort(-self._popularity[rows], kind='stable')]
+
+        return [self._entry(int(row)) for row in rows]
+
+    def search(self, query: str, limit: int = 20) -> list[CatalogEntry]:
+        """Titles starting with the query or sharing words with it, ranked by similarity to the query and popularity."""
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        lo, hi = self._prefix_range(self._titles, self._title_offsets, normalized)
+        prefix_rows = set(self._most_popular(lo, hi, limit).tolist())
+
+        # Rows containing a query word count twice as much as the ones containing a word close to it
+        hits = defaultdict(int)
+
+        for word in set(normalized.split()):
+            # The window is centered on the word itself, its first letters only bound how far it can reach
+            center = self._lower_bound(self._tokens, self._token_offsets, word.encode('utf-8'))
+            token_lo, token_hi = self._prefix_range(self._tokens, self._token_offsets, word[:FUZZY_PREFIX])
+
+            for token in range(max(token_lo, center - FUZZY_TOKENS // 2), min(token_hi, center + FUZZY_TOKENS // 2)):
+                if token == center and self._string(self._tokens, self._token_offsets, token) == word.encode('utf-8'):
+                    for row in self._postings_of(token, FUZZY_POSTINGS):
+                        hits[row] += 2
+                else:
+                    for row in set(self._postings_of(token, FUZZY_NEIGHBOUR_POSTINGS)):
+                        hits[row] += 1
+
+        for row in prefix_rows:
+            hits.pop(row, None)
+
+        candidates = [*prefix_rows, *heapq.nlargest(MAX_CANDIDATES, hits, key=lambda r: (hits[r], self._popularity[r]))]
+
+        # Prefix hits are scored like the others: "matrix" is only a partial match of "matrix reloaded"
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(normalized)
+        scored = []
+
+        for row in candidates:
+            matcher.set_seq1(self._string(self._titles, self._title_offsets, row).decode('utf-8'))
+
+            if matcher.real_quick_ratio() < MIN_SIMILARITY or matcher.quick_ratio() < MIN_SIMILARITY:
+                continue
+            similarity = matcher.ratio()
+            if similarity < MIN_SIMILARITY:
+                continue
+
+            scored.append((similarity + POPULARITY_WEIGHT * np.log1p(self._popularity[row]), similarity, row))
+
+        scored.sort(reverse=True)
+
+        return [self._entry(row, similarity) for _, similarity, row in scored[:limit]]
+
+
+def get_pointer_path(root: Path, type: Literal['movie', 'tv']) -> Path:
+    return root / f'{type}.json'
+
+
+def read_pointer(root: Path, type: Literal['movie', 'tv']) -> Optional[dict]:
+    pointer_path = get_pointer_path(root, type)
+
+    if not pointer_path.exists():
+        return None
+
+    return json.loads(pointer_path.read_text())
+
+
+def download_export(type: Literal['movie', 'tv'], day: date, path: Path) -> bool:
+    url = EXPORT_URL.format(kind=EXPORT_KINDS[type], day=day)
+
+    with requests.get(url, stream=True) as response:
+        if response.status_code in (403, 404):
+            return False
+        response.raise_for_status()
+
+        with path.open('wb') as file:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                file.write(chunk)
+
+    return True
+
+
+def refresh_catalog(root: Path, type: Literal['movie', 'tv'], day: Optional[date] = None) -> bool:
+    """
+    Build the index of the latest export, unless it is already the current one. Exports are published once a day, so
+    yesterday's file is used when today's is not out yet. Exports are full dumps and the index files are sorted by
+    title, so every new export is downloaded and indexed from scratch. Returns whether the index changed.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    current = read_pointer(root, type)
+    days = [day] if day else [date.today(), date.today() - timedelta(days=1)]
+
+    for export_day in days:
+        if current is not None and current['export_date'] >= export_day.isoformat():
+            logger.debug(f'{type} catalog already at {current["export_date"]}')
+            return False
+
+        with tempfile.TemporaryDirectory(dir=root) as tmp:
+            export_path = Path(tmp) / 'export.json.gz'
+
+            if not download_export(type=type, day=export_day, path=export_path):
+                continue
+
+            directory = root / f'{type}-{export_day.isoformat()}'
+            shutil.rmtree(directory, ignore_errors=True)
+            directory.mkdir()
+            build_index(export_path=export_path, directory=directory)
+
+        pointer_path = get_pointer_path(root, type)
+        tmp_pointer = pointer_path.with_suffix('.tmp')
+        tmp_pointer.write_text(json.dumps({'export_date': export_day.isoformat(), 'directory': directory.name}))
+        os.replace(tmp_pointer, pointer_path)
+
+        # Indexes opened before the swap keep their mapped files alive until they are closed
+        if current is not None and current['directory'] != directory.name:
+            shutil.rmtree(root / current['directory'], ignore_errors=True)
+
+        return True
+
+    logger.warning(f'No {type} export found for {", ".join(d.isoformat() for d in days)}')
+
+    return False
+
+
+_indexes: dict[str, CatalogIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_catalog(type: Literal['movie', 'tv']) -> Optional[CatalogIndex]:
+    if CatalogSettings().CATALOG_PATH is None:
+        return None
+
+    root = Path(CatalogSettings().CATALOG_PATH)
+    pointer = read_pointer(root, type)
+
+    if pointer is None:
+        return None
+
+    with _indexes_lock:
+        index = _indexes.get(type)
+
+        if index is None or index.directory.name != pointer['directory']:
+            index = CatalogIndex(directory=root / pointer['directory'], type=type)
+            _indexes[type] = index
+
+    return index
+
+
+def search_catalog(query: str, type: Literal['movie', 'tv'], limit: int = 20) -> list[CatalogEntry]:
+    """Confident matches only, i.e. titles nearly equal to the query: partial queries are left to the TMDB search."""
+    catalog = get_catalog(type)
+
+    if catalog is None or len(normalize(query)) < CONFIDENT_QUERY_LENGTH:
+        return []
+
+    return [entry for entry in catalog.search(query=query, limit=limit) if entry.similarity >= CONFIDENT_SIMILARITY]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the offline TMDB catalog')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    refresh_parser = subparsers.add_parser('refresh', help='download and index the latest daily exports')
+    refresh_parser.add_argument('--type', choices=['movie', 'tv'], nargs='*', default=['movie', 'tv'])
+    refresh_parser.add_argument('--date', type=date.fromisoformat, default=None)
+
+    search_parser = subparsers.add_parser('search', help='search the offline catalog')
+    search_parser.add_argument('query')
+    search_parser.add_argument('--type', choices=['movie', 'tv'], default='movie')
+
+    args = parser.parse_args()
+
+    if CatalogSettings().CATALOG_PATH is None:
+        parser.error('CATALOG_PATH is not set')
+
+    if args.command == 'refresh':
+        for media_type in args.type:
+            refresh_catalog(root=Path(CatalogSettings().CATALOG_PATH), type=media_type, day=args.date)
+    else:
+        catalog = get_catalog(args.type)
+        if catalog is None:
+            parser.error(f'No {args.type} catalog yet, run refresh first')
+
+        for entry in catalog.search(query=args.query):
+            print(f'{entry.id:>8}  {entry.popularity:>8.2f}  {entry.similarity:>5.2f}  {entry.name}')
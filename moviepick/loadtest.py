@@ -0,0 +1,329 @@
+"""
+Load test for the voting page and the backlog editor.
+
+Every simulated session runs in its own thread, like Streamlit script runs do, and repeatedly casts votes, edits
+backlog rows, presses "Rivota" or "Termina". Backlog edits go through utils.apply_changes, the voting page callbacks are
+mirrored below since they live in the page script. Mongo is replaced by mongomock unless a connection string is given.
+
+    python loadtest.py --sessions 8 --duration 10
+"""
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Optional
+
+import pandas as pd
+from pymongo import MongoClient
+from pymongo.synchronous.collection import Collection
+
+from models import Movie, Vote, media_factory
+from settings import PEOPLE
+from utils import apply_changes, get_medias_df, vote_to_label
+
+OPERATIONS = {'vote': 0.5, 'edit': 0.3, 'rivota': 0.1, 'termina': 0.1}
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.lock_waits: dict[str, list[float]] = defaultdict(list)
+        self.lost_updates: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record_latency(self, operation: str, seconds: float):
+        with self._lock:
+            self.latencies[operation].append(seconds)
+
+    def record_lock_wait(self, key: str, seconds: float):
+        with self._lock:
+            self.lock_waits[key].append(seconds)
+
+    def record_lost_updates(self, target: str, count: int):
+        with self._lock:
+            self.lost_updates[target] += count
+
+    def record_error(self, operation: str, error: Exception):
+        with self._lock:
+            self.errors[f'{operation}: {type(error).__name__}'] += 1
+
+
+class ServerState:
+    """Stand-in for streamlit_server_state: a shared dict with one lock per key."""
+
+    def __init__(self, stats: Stats):
+        self.values: dict[str, Any] = {}
+        self._stats = stats
+        self._locks: dict[str, threading.RLock] = defaultdict(threading.RLock)
+        self._locks_lock = threading.Lock()
+
+    @contextmanager
+    def lock(self, key: str):
+        with self._locks_lock:
+            lock = self._locks[key]
+
+        start = time.perf_counter()
+        with lock:
+            self._stats.record_lock_wait(key, time.perf_counter() - start)
+            yield
+
+
+class SlowCollection:
+    """Adds a fixed round trip to every collection call, mongomock answers instantly and hides interleavings."""
+
+    def __init__(self, collection: Collection, latency: float):
+        self._collection = collection
+        self._latency = latency
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._collection, name)
+
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return attribute(*args, **kwargs)
+
+        return call
+
+
+def get_collections(connection_string: Optional[str], latency: float) -> tuple[Collection, Collection]:
+    if connection_string is None:
+        import mongomock
+
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(connection_string)
+
+    db = client.get_database(name='moviepick_loadtest')
+    db.drop_collection('backlog')
+    db.drop_collection('vote_order')
+
+    return SlowCollection(db['backlog'], latency), SlowCollection(db['vote_order'], latency)
+
+
+def seed(backlog: Collection, vote_order: Collection, medias: int):
+    for i in range(medias):
+        movie = Movie(name=f'Film {i}',
+                      saga='',
+                      subtype='Film',
+                      reporter=random.choice(PEOPLE),
+                      votes=[Vote(user=user, value=random.choice([-1, 0, 1])) for user in PEOPLE])
+        backlog.insert_one(movie.model_dump(exclude={'id'}, mode='json'))
+
+    vote_order.insert_one({'order': sorted(PEOPLE)})
+
+
+class Session(threading.Thread):
+    def __init__(self, idx: int, sessions: int, backlog: Collection, vote_order: Collection, state: ServerState,
+                 stats: Stats, media_ids: list[str], expected: dict[tuple[str, str], int], deadline: float,
+                 think_time: float):
+        super().__init__(name=f'session-{idx}')
+        self.idx = idx
+        self.user = PEOPLE[idx % len(PEOPLE)]
+        self.backlog = backlog
+        self.vote_order = vote_order
+        self.state = state
+        self.stats = stats
+        self.media_ids = media_ids
+        self.expected = expected
+        self.deadline = deadline
+        self.think_time = think_time
+
+        # Every backlog vote cell has a single writer, so any other value found at the end was overwritten by someone
+        cells = [(media_id, user) for media_id in media_ids for user in PEOPLE]
+        self.owned_cells = [cell for pos, cell in enumerate(cells) if pos % sessions == idx]
+
+    def think(self):
+        time.sleep(random.uniform(0, self.think_time))
+
+    def run(self):
+        operations = [o for o in OPERATIONS if o != 'edit' or self.owned_cells]
+        weights = [OPERATIONS[o] for o in operations]
+
+        while time.perf_counter() < self.deadline:
+            operation = random.choices(operations, weights=weights)[0]
+
+            try:
+                getattr(self, operation)()
+            except Exception as e:
+                self.stats.record_error(operation, e)
+
+    def timed(self, operation: str, start: float):
+        self.stats.record_latency(operation, time.perf_counter() - start)
+
+    def render_medias(self) -> pd.DataFrame:
+        medias = (media_factory(raw_media=r_m) for r_m in self.backlog.find({'type': 'movie'}))
+
+        return get_medias_df(medias=medias, filters={}, reference_model=Movie)
+
+    def vote(self):
+        # Page rerun: voting.py loads the backlog and the vote order, then reads the votes without holding the lock
+        start = time.perf_counter()
+        self.render_medias()
+        self.vote_order.find_one()
+        self.timed('render', start)
+
+        if 'edited_votes' in self.state.values:
+            votes_df = self.state.values['edited_votes']
+        else:
+            votes_df = pd.DataFrame(data=[{'user': user, 'vote': 'Film 0'} for user in PEOPLE])
+        rendered = votes_df['vote'].to_list()
+
+        self.think()
+        start = time.perf_counter()
+
+        # voting.update_votes
+        with self.state.lock('edited_votes'):
+            current = self.state.values.get('edited_votes')
+            if current is not None and current is not votes_df:
+                lost = sum(old != new for old, new in zip(rendered, current['vote'].to_list()))
+                self.stats.record_lost_updates('edited_votes', lost)
+
+            votes = votes_df['vote'].to_list()
+            votes[PEOPLE.index(self.user)] = f'Film {random.randrange(len(self.media_ids))}'
+            votes_df['vote'] = votes
+
+            self.state.values['edited_votes'] = votes_df
+
+        self.timed('vote', start)
+
+    def edit(self):
+        start = time.perf_counter()
+        data = self.render_medias()
+        self.timed('render', start)
+
+        media_id, user = random.choice(self.owned_cells)
+        value = random.choice([-1, 0, 1])
+        idx = data.index[data['id'] == media_id][0]
+
+        self.think()
+        start = time.perf_counter()
+
+        apply_changes(collection=self.backlog,
+                      data=data,
+                      changes={'edited_rows': {idx: {user: vote_to_label(value)}}, 'added_rows': []})
+        self.expected[(media_id, user)] = value
+
+        self.timed('edit', start)
+
+    def rivota(self):
+        self.think()
+        start = time.perf_counter()
+
+        # voting.restrict_medias
+        with self.state.lock('restricted_data'):
+            self.state.values['restricted_data'] = random.sample(self.media_ids, k=min(2, len(self.media_ids)))
+
+        self.timed('rivota', start)
+
+    def termina(self):
+        order = self.vote_order.find_one()['order']
+
+        self.think()
+        start = time.perf_counter()
+
+        # Same statements as the "Termina" branch of voting.py, a missing key aborts the run there too
+        with self.state.lock('restricted_data'):
+            del self.state.values['restricted_data']
+
+        with self.state.lock('edited_votes'):
+            del self.state.values['edited_votes']
+
+        if self.vote_order.find_one()['order'] != order:
+            self.stats.record_lost_updates('vote_order', 1)
+
+        order.append(order.pop(0))
+        self.vote_order.update_one(filter={}, update={'$set': {'order': order}}, upsert=True)
+
+        self.timed('termina', start)
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def count_lost_backlog_updates(backlog: Collection, expected: dict[tuple[str, str], int]) -> int:
+    lost = 0
+
+    for raw_media in backlog.find():
+        media = media_factory(raw_media=raw_media)
+        votes = {vote.user: vote.value for vote in media.votes}
+
+        lost += sum(1 for user in PEOPLE if (media.id, user) in expected and votes.get(user) != expected[(media.id, user)])
+
+    return lost
+
+
+def report(stats: Stats, elapsed: float):
+    operations = sum(len(latencies) for op, latencies in stats.latencies.items() if op != 'render')
+    print(f'Throughput: {operations / elapsed:.1f} ops/s ({operations} ops in {elapsed:.1f}s)')
+
+    print('\nLatency (ms)          count      p50      p95      p99      max')
+    for operation, latencies in sorted(stats.latencies.items()):
+        print(f'  {operation:<16}{len(latencies):>9}' + ''.join(f'{percentile(latencies, q) * 1000:>9.2f}'
+                                                            for q in (0.5, 0.95, 0.99, 1.0)))
+
+    print('\nLock wait (ms)        count      p50      p95      p99      max')
+    for key, waits in sorted(stats.lock_waits.items()):
+        print(f'  {key:<16}{len(waits):>9}' + ''.join(f'{percentile(waits, q) * 1000:>9.2f}'
+                                                      for q in (0.5, 0.95, 0.99, 1.0)))
+
+    print('\nLost updates')
+    for target in ('backlog', 'edited_votes', 'vote_order'):
+        print(f'  {target:<16}{stats.lost_updates[target]:>9}')
+
+    if stats.errors:
+        print('\nErrors')
+        for error, count in sorted(stats.errors.items()):
+            print(f'  {error:<32}{count:>9}')
+
+
+def run(sessions: int, duration: float, medias: int, think_time: float, db_latency: float,
+        connection_string: Optional[str]) -> Stats:
+    stats = Stats()
+    state = ServerState(stats=stats)
+
+    backlog, vote_order = get_collections(connection_string=connection_string, latency=db_latency)
+    seed(backlog=backlog, vote_order=vote_order, medias=medias)
+    media_ids = [str(raw_media['_id']) for raw_media in backlog.find()]
+    expected = {}
+
+    start = time.perf_counter()
+    threads = [Session(idx=idx, sessions=sessions, backlog=backlog, vote_order=vote_order, state=state, stats=stats,
+                       media_ids=media_ids, expected=expected, deadline=start + duration, think_time=think_time)
+               for idx in range(sessions)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+    stats.record_lost_updates('backlog', count_lost_backlog_updates(backlog=backlog, expected=expected))
+
+    report(stats=stats, elapsed=elapsed)
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate concurrent voting and backlog editing sessions')
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--medias', type=int, default=50)
+    parser.add_argument('--think-time', type=float, default=0.05, help='max seconds between render and action')
+    parser.add_argument('--db-latency', type=float, default=0.002, help='seconds added to every Mongo call')
+    parser.add_argument('--connection-string', default=None, help='use a real Mongo instead of mongomock')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    run(sessions=args.sessions, duration=args.duration, medias=args.medias, think_time=args.think_time,
+        db_latency=args.db_latency, connection_string=args.connection_string)
@@ -31,6 +31,14 @@ PyObjectId = Annotated[
 ]
 
 
+class TMDBMetadata(BaseModel):
+    id: int
+    genre_ids: list[int] = Field(default_factory=list)
+    original_language: Optional[str] = None
+    popularity: float = Field(default=0.0, ge=0.0)
+    vote_average: float = Field(default=0.0, ge=0.0)
+
+
 class AbstractMedia(BaseModel):
     id: Optional[PyObjectId] = Field(default=None, alias='_id')
     name: str
@@ -42,6 +50,7 @@ class AbstractMedia(BaseModel):
     scheduled_on: Optional[date] = None
     viewed_on: Optional[date] = None
     subtype: Literal['']
+    tmdb: Optional[TMDBMetadata] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -115,6 +124,14 @@ class TMDBShow(TMDBMedia):
     name: str
 
 
+class CatalogEntry(BaseModel):
+    id: int
+    name: str
+    popularity: float = Field(ge=0.0)
+    type: Literal['movie', 'tv']
+    similarity: float = Field(default=1.0, ge=0.0, le=1.0)
+
+
 class TMDBSearchResult(BaseModel):
     page: int = Field(ge=0)
     results: list[Union[TMDBMovie | TMDBShow]]
@@ -124,3 +141,41 @@ class TMDBSearchResult(BaseModel):
     # @field_validator('results', mode='before')
     # @classmethod
     # def validate results
+
+
+class AgreementStats(BaseModel):
+    first: str
+    second: str
+    shared_votes: int = Field(ge=0)
+    agreements: int = Field(ge=0)
+    agreement: float = Field(ge=0.0, le=1.0)
+
+
+class ScoreStats(BaseModel):
+    group: str
+    votes: int = Field(ge=0)
+    score_avg: float = Field(ge=-1.0, le=1.0)
+
+
+class ReporterStats(BaseModel):
+    reporter: Literal[*PEOPLE]
+    proposals: int = Field(ge=0)
+    viewed: int = Field(ge=0)
+    acceptance_rate: float = Field(ge=0.0, le=1.0)
+
+
+class WatchTimeStats(BaseModel):
+    subtype: str
+    viewed: int = Field(ge=0)
+    days_to_watch_avg: Optional[float] = None
+    schedule_delay_avg: Optional[float] = None
+
+
+class ScheduledMedia(BaseModel):
+    media: Media
+    scheduled_on: date
+
+
+class Recommendation(BaseModel):
+    media: Media
+    score: float
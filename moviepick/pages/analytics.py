@@ -0,0 +1,67 @@
+import pandas as pd
+import streamlit as st
+
+from analytics import get_agreement_stats, get_subtype_score_stats, get_reporter_score_stats, get_reporter_stats, \
+    get_watch_time_stats, invalidate_cache
+from utils import render_sidebar
+
+st.set_page_config(layout='wide')
+render_sidebar()
+st.title('Statistiche')
+
+if st.button('Aggiorna'):
+    invalidate_cache()
+
+col1, col2 = st.columns(2)
+
+with col1:
+    st.subheader('Accordo tra utenti')
+    agreement = pd.DataFrame([s.model_dump() for s in get_agreement_stats()])
+    st.dataframe(agreement,
+                 hide_index=True,
+                 column_config={'first': 'Utente',
+                                'second': 'Utente',
+                                'shared_votes': 'Voti in comune',
+                                'agreements': 'Voti uguali',
+                                'agreement': st.column_config.ProgressColumn(label='Accordo',
+                                                                             min_value=0.0,
+                                                                             max_value=1.0)})
+
+    st.subheader('Proposte accettate')
+    reporters = pd.DataFrame([s.model_dump() for s in get_reporter_stats()])
+    st.dataframe(reporters,
+                 hide_index=True,
+                 column_config={'reporter': 'Proposto da',
+                                'proposals': 'Proposte',
+                                'viewed': 'Viste',
+                                'acceptance_rate': st.column_config.ProgressColumn(label='Tasso di accettazione',
+                                                                                   min_value=0.0,
+                                                                                   max_value=1.0)})
+
+    st.subheader('Tempi di visione')
+    watch_time = pd.DataFrame([s.model_dump() for s in get_watch_time_stats()])
+    st.dataframe(watch_time,
+                 hide_index=True,
+                 column_config={'subtype': 'Tipo',
+                                'viewed': 'Visti',
+                                'days_to_watch_avg': st.column_config.NumberColumn(label='Giorni dalla proposta',
+                                                                                   format='%.1f'),
+                                'schedule_delay_avg': st.column_config.NumberColumn(label='Giorni dalla pianificazione',
+                                                                                    format='%.1f')})
+
+with col2:
+    score_columns = {'group': None,
+                     'votes': 'Voti',
+                     'score_avg': st.column_config.NumberColumn(label='Media voti', format='%.2f')}
+
+    st.subheader('Media voti per tipo')
+    subtype_scores = pd.DataFrame([s.model_dump() for s in get_subtype_score_stats()])
+    if len(subtype_scores) > 0:
+        st.bar_chart(subtype_scores, x='group', y='score_avg', x_label='Tipo', y_label='Media voti')
+    st.dataframe(subtype_scores, hide_index=True, column_config=score_columns | {'group': 'Tipo'})
+
+    st.subheader('Media voti per proponente')
+    reporter_scores = pd.DataFrame([s.model_dump() for s in get_reporter_score_stats()])
+    if len(reporter_scores) > 0:
+        st.bar_chart(reporter_scores, x='group', y='score_avg', x_label='Proposto da', y_label='Media voti')
+    st.dataframe(reporter_scores, hide_index=True, column_config=score_columns | {'group': 'Proposto da'})
@@ -1,13 +1,16 @@
 from typing import Iterable, Optional
 
 import pandas as pd
+import requests
 import streamlit as st
+from loguru import logger
+from pydantic import ValidationError
 
-from models import Media
+from models import Media, Movie, Show, Episode, Season, TMDBMovie, TMDBShow
 from moviepick.models import AbstractMedia
 from moviepick.settings import PEOPLE
-from utils import get_medias, vote_to_label, label_to_vote, save_data, search_movie, \
-    search_show
+from utils import get_medias, vote_to_label, label_to_vote, save_data, search_movie, add_media, get_tmdb_metadata, \
+    resolve_catalog_entry, search_show
 
 from moviepick.utils import render_sidebar
 
@@ -166,18 +169,53 @@ with col_2:
                 st.session_state['selected_media_obj'] = None
 
                 if 'matching_medias' in st.session_state and 'selected_media' in st.session_state:
-                    st.session_state['selected_media_obj'] = next(
-                        (media for media in st.session_state['matching_medias']
-                         if media.name == st.session_state['selected_media']), None)
+                    selected_media_obj = next((media for media in st.session_state['matching_medias']
+                                               if media.name == st.session_state['selected_media']), None)
+
+                    if selected_media_obj is not None:
+                        resolved_medias = st.session_state.setdefault('resolved_medias', {})
+                        key = (selected_media_obj.id, type(selected_media_obj).__name__)
+                        if key not in resolved_medias:
+                            try:
+                                resolved_medias[key] = resolve_catalog_entry(selected_media_obj)
+                            except (requests.HTTPError, ValidationError) as e:
+                                logger.warning(f'Could not resolve {selected_media_obj.name}: {e}')
+                                resolved_medias[key] = None
+                        selected_media_obj = resolved_medias[key]
+
+                        if selected_media_obj is None:
+                            st.warning('Dettagli TMDB non disponibili per il titolo scelto')
+
+                    st.session_state['selected_media_obj'] = selected_media_obj
 
                 name = st.text_input(label='Titolo',
                                      value=st.session_state['selected_media_obj'].name
                                      if st.session_state['selected_media_obj'] else '')
                 poster_link = st.text_input(label='Link copertina custom')
 
-                if poster_link or st.session_state['selected_media_obj']:
+                if poster_link or getattr(st.session_state['selected_media_obj'], 'poster_path', None):
                     st.image(
                         poster_link or f'http://image.tmdb.org/t/p/w500{st.session_state['selected_media_obj'].poster_path}')
             except NameError:
                 pass
-        st.form_submit_button()
+
+        with col_2:
+            reporter = st.selectbox(label='Proposto da', options=PEOPLE)
+            subtype = st.selectbox(label='Tipo',
+                                   options=['Film', 'Film anime'] if media_type == 'Film' else ['Serie', 'Serie anime'])
+        with col_3:
+            saga = st.text_input(label='Saga', disabled=media_type != 'Film')
+            order = st.number_input(label='Episodio/Stagione', min_value=0, step=1, value=1)
+
+        if st.form_submit_button() and name:
+            selected_media_obj = st.session_state['selected_media_obj']
+            tmdb = get_tmdb_metadata(selected_media_obj) if isinstance(selected_media_obj, (TMDBMovie, TMDBShow)) \
+                else None
+
+            if media_type == 'Film':
+                media = Movie(name=name, reporter=reporter, subtype=subtype, saga=saga,
+                              episode=Episode(order=order) if saga else None, tmdb=tmdb)
+            else:
+                media = Show(name=name, reporter=reporter, subtype=subtype, season=Season(order=order), tmdb=tmdb)
+
+            add_media(media)
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from planner import plan_schedule, save_schedule, get_booked_sessions
+from utils import render_sidebar, get_medias
+
+st.set_page_config(layout='wide')
+render_sidebar()
+st.title('Pianifica')
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    first_session = st.date_input(label='Prima serata', value=date.today())
+with col2:
+    sessions_count = st.number_input(label='Serate', min_value=1, value=4, step=1)
+with col3:
+    interval = st.number_input(label='Giorni tra le serate', min_value=1, value=7, step=1)
+
+sessions = [first_session + timedelta(days=interval * i) for i in range(sessions_count)]
+
+medias = [*get_medias(media_type='movie'), *get_medias(media_type='show')]
+free_sessions = set(sessions) - get_booked_sessions(medias)
+schedule = plan_schedule(medias=medias, sessions=free_sessions)
+
+data = pd.DataFrame([{'scheduled_on': s.scheduled_on,
+                      'name': s.media.name,
+                      'subtype': s.media.subtype,
+                      'reporter': s.media.reporter} for s in schedule],
+                    columns=['scheduled_on', 'name', 'subtype', 'reporter'])
+
+st.dataframe(data,
+             hide_index=True,
+             column_config={'scheduled_on': st.column_config.DateColumn(label='Pianificato il'),
+                            'name': 'Titolo',
+                            'subtype': 'Tipo',
+                            'reporter': 'Proposto da'})
+
+if len(free_sessions) < len(sessions):
+    st.info(f'{len(sessions) - len(free_sessions)} serate su {len(sessions)} sono già pianificate')
+if len(schedule) < len(free_sessions):
+    st.warning(f'Solo {len(schedule)} serate libere su {len(free_sessions)} hanno un titolo disponibile')
+
+if st.button('Salva', disabled=not schedule):
+    save_schedule(schedule)
+    st.success('Pianificazione salvata')
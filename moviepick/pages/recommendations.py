@@ -0,0 +1,33 @@
+import pandas as pd
+import streamlit as st
+
+from recommender import recommend
+from utils import render_sidebar, backfill_tmdb_metadata
+
+st.set_page_config(layout='wide')
+render_sidebar()
+st.title('Consigli')
+
+col1, col2 = st.columns(2)
+
+with col1:
+    k = st.slider(label='Titoli', min_value=1, max_value=50, value=10)
+with col2:
+    if st.button('Recupera metadati TMDB', help='Cerca su TMDB i titoli del backlog aggiunti senza metadati'):
+        with st.spinner('Recupero metadati...'):
+            st.success(f'Metadati aggiunti a {backfill_tmdb_metadata()} titoli')
+
+recommendations = recommend(k=k)
+
+data = pd.DataFrame([{'name': r.media.name,
+                      'subtype': r.media.subtype,
+                      'reporter': r.media.reporter,
+                      'score': r.score} for r in recommendations],
+                    columns=['name', 'subtype', 'reporter', 'score'])
+
+st.dataframe(data,
+             hide_index=True,
+             column_config={'name': 'Titolo',
+                            'subtype': 'Tipo',
+                            'reporter': 'Proposto da',
+                            'score': st.column_config.NumberColumn(label='Punteggio', format='%.2f')})
@@ -0,0 +1,163 @@
+import heapq
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Optional
+
+from bson import ObjectId
+from loguru import logger
+from pymongo import UpdateOne
+
+from models import Media, Movie, ScheduledMedia
+from settings import MongoSettings, PEOPLE
+from utils import get_mongo_db, get_mongo_collection, notify_backlog_write
+
+
+def get_chain_key(media: Media) -> Optional[tuple[str, str]]:
+    if isinstance(media, Movie):
+        if media.episode is None or not media.saga:
+            return None
+
+        return media.type, media.saga
+
+    return media.type, media.name
+
+
+def get_chain_order(media: Media) -> int:
+    if isinstance(media, Movie):
+        return media.episode.order
+
+    return media.season.order
+
+
+def get_chains(medias: Iterable[Media]) -> list[list[Media]]:
+    """Group sagas and shows into chains sorted by episode/season, every other media is a chain on its own."""
+    chains = defaultdict(list)
+    standalone = []
+
+    for media in medias:
+        key = get_chain_key(media)
+
+        if key is None:
+            standalone.append([media])
+        else:
+            chains[key].append(media)
+
+    for chain in chains.values():
+        chain.sort(key=lambda m: (get_chain_order(m), m.name))
+
+    return [*chains.values(), *standalone]
+
+
+def get_votes_avg(media: Media) -> Optional[float]:
+    votes = {vote.user: vote.value for vote in media.votes}
+
+    if any(votes.get(user) is None for user in PEOPLE):
+        return None
+
+    return sum(votes[user] for user in PEOPLE) / len(PEOPLE)
+
+
+def get_blocked_media_ids(medias: Iterable[Media]) -> set[str]:
+    """Ids of the medias that come after a not yet viewed episode/season of the same chain."""
+    blocked = set()
+
+    for chain in get_chains(medias):
+        pending = False
+
+        for media in chain:
+            if pending:
+                blocked.add(media.id)
+
+            pending = pending or not media.viewed
+
+    return blocked
+
+
+def get_booked_sessions(medias: Iterable[Media]) -> set[date]:
+    return {media.scheduled_on for media in medias if media.scheduled_on is not None}
+
+
+def plan_schedule(medias: Iterable[Media], sessions: Iterable[date]) -> list[ScheduledMedia]:
+    """
+    Assign one media to each free session, highest votes average first, never scheduling an episode/season before the
+    previous one. A media is available when it has every vote and is neither viewed nor scheduled, a session is free
+    when no media is already scheduled on it. Medias missing votes block the rest of their chain.
+    """
+    medias = list(medias)
+    booked = get_booked_sessions(medias)
+    chains = get_chains(medias)
+    scores = [[get_votes_avg(media) for media in chain] for chain in chains]
+
+    # Best score reachable further down each chain, used to break ties in favour of chains worth unlocking
+    downstream = []
+    for chain_scores in scores:
+        best = [0.0] * len(chain_scores)
+        running = None
+
+        for pos in reversed(range(len(chain_scores))):
+            score = chain_scores[pos]
+            running = None if score is None else score if running is None else max(score, running)
+            best[pos] = running
+
+        downstream.append(best)
+
+    ready: list[tuple[float, float, str, int, int]] = []
+    waiting: list[tuple[date, int, int]] = []
+
+    def advance(chain_idx: int, pos: int, release: Optional[date]):
+        chain = chains[chain_idx]
+
+        for pos in range(pos, len(chain)):
+            media = chain[pos]
+
+            if media.viewed:
+                continue
+            if media.scheduled_on is not None:
+                release = media.scheduled_on if release is None else max(release, media.scheduled_on)
+                continue
+            if scores[chain_idx][pos] is None:
+                return
+
+            if release is None:
+                heapq.heappush(ready, (-scores[chain_idx][pos], -downstream[chain_idx][pos], media.name, chain_idx, pos))
+            else:
+                heapq.heappush(waiting, (release, chain_idx, pos))
+            return
+
+    for chain_idx in range(len(chains)):
+        advance(chain_idx=chain_idx, pos=0, release=None)
+
+    schedule = []
+
+    for session in sorted(set(sessions) - booked):
+        while waiting and waiting[0][0] < session:
+            _, chain_idx, pos = heapq.heappop(waiting)
+            media = chains[chain_idx][pos]
+            heapq.heappush(ready, (-scores[chain_idx][pos], -downstream[chain_idx][pos], media.name, chain_idx, pos))
+
+        if not ready:
+            continue
+
+        *_, chain_idx, pos = heapq.heappop(ready)
+        schedule.append(ScheduledMedia(media=chains[chain_idx][pos], scheduled_on=session))
+
+        advance(chain_idx=chain_idx, pos=pos + 1, release=session)
+
+    return schedule
+
+
+def save_schedule(schedule: list[ScheduledMedia]):
+    updates = [UpdateOne(filter={'_id': ObjectId(s.media.id)},
+                         update={'$set': {'scheduled_on': s.scheduled_on.isoformat()}})
+               for s in schedule]
+
+    if not updates:
+        return
+
+    logger.debug(f'Saving schedule of {len(updates)} medias...')
+    db = get_mongo_db(connection_string=MongoSettings().CONNECTION_STRING, db_name=MongoSettings().DATABASE)
+    collection = get_mongo_collection(db=db, collection_name=MongoSettings().BACKLOG_COLLECTION)
+
+    collection.bulk_write(updates, ordered=False)
+
+    notify_backlog_write([s.media.model_copy(update={'scheduled_on': s.scheduled_on}) for s in schedule])
@@ -0,0 +1,296 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Optional
+
+import numpy as np
+from loguru import logger
+
+from models import Media, Recommendation
+from planner import get_chain_key, get_chain_order
+from settings import PEOPLE
+from utils import get_medias, on_backlog_write
+
+# TMDB genres (movies and TV), see https://developer.themoviedb.org/reference/genre-movie-list
+GENRE_IDS = (28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37,
+             10759, 10762, 10763, 10764, 10765, 10766, 10767, 10768)
+LANGUAGES = ('en', 'it', 'ja', 'ko', 'fr', 'es', 'de', 'zh')
+
+GENRE_COLUMNS = {genre_id: idx for idx, genre_id in enumerate(GENRE_IDS)}
+LANGUAGE_COLUMNS = {language: len(GENRE_IDS) + idx for idx, language in enumerate(LANGUAGES)}
+OTHER_LANGUAGE_COLUMN = len(GENRE_IDS) + len(LANGUAGES)
+POPULARITY_COLUMN = OTHER_LANGUAGE_COLUMN + 1
+VOTE_AVERAGE_COLUMN = POPULARITY_COLUMN + 1
+FEATURES = VOTE_AVERAGE_COLUMN + 1
+
+# A title counts as highly rated when the group average reaches this value
+LIKED_THRESHOLD = 0.5
+
+VOTES_WEIGHT = 1.0
+AFFINITY_WEIGHT = 1.0
+SIMILARITY_WEIGHT = 0.5
+
+INITIAL_CAPACITY = 1024
+
+# Writes made by another process (e.g. the Streamlit app for the API) do not reach our hooks, so rebuild periodically
+REBUILD_TTL = 300
+
+
+def features_matrix(medias: list[Media]) -> np.ndarray:
+    """One L2-normalized feature row per media, all zeros for the ones without TMDB metadata."""
+    features = np.zeros((len(medias), FEATURES), dtype=np.float32)
+
+    rows = [row for row, media in enumerate(medias) if media.tmdb is not None]
+    tmdbs = [medias[row].tmdb for row in rows]
+
+    genre_rows, genre_columns, genre_weights = [], [], []
+    for row, tmdb in zip(rows, tmdbs):
+        columns = [GENRE_COLUMNS[g] for g in tmdb.genre_ids if g in GENRE_COLUMNS]
+        genre_rows.extend([row] * len(columns))
+        genre_columns.extend(columns)
+        genre_weights.extend([1 / np.sqrt(len(columns))] * len(columns))
+
+    features[genre_rows, genre_columns] = genre_weights
+    features[rows, [LANGUAGE_COLUMNS.get(t.original_language, OTHER_LANGUAGE_COLUMN) for t in tmdbs]] = 1.0
+    features[rows, POPULARITY_COLUMN] = np.minimum(np.log1p([t.popularity for t in tmdbs]) / np.log1p(1000), 1.0)
+    features[rows, VOTE_AVERAGE_COLUMN] = np.array([t.vote_average for t in tmdbs]) / 10
+
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+
+    return np.divide(features, norms, out=features, where=norms > 0)
+
+
+def votes_matrix(medias: list[Media]) -> np.ndarray:
+    """One row per media and one column per person, NaN where the vote is missing."""
+    votes = [{vote.user: vote.value for vote in media.votes} for media in medias]
+
+    return np.array([[v.get(user) for user in PEOPLE] for v in votes], dtype=np.float32).reshape(-1, len(PEOPLE))
+
+
+class Recommender:
+    """
+    Keeps the feature matrix and the per-person vote matrix of the whole backlog in memory, together with the running
+    sums needed to score candidates, so that a vote only costs a couple of row updates instead of a rebuild.
+    """
+
+    def __init__(self, medias: Iterable[Media] = ()):
+        self._lock = threading.Lock()
+        self._medias: list[Media] = list(medias)
+        self._rows: dict[str, int] = {media.id: row for row, media in enumerate(self._medias)}
+
+        n = len(self._medias)
+        capacity = max(INITIAL_CAPACITY, n)
+
+        self._features = np.zeros((capacity, FEATURES), dtype=np.float32)
+        self._features[:n] = features_matrix(self._medias)
+        self._votes = np.full((capacity, len(PEOPLE)), np.nan, dtype=np.float32)
+        self._votes[:n] = votes_matrix(self._medias)
+        self._candidates = np.zeros(capacity, dtype=bool)
+        self._candidates[:n] = [not media.viewed and media.scheduled_on is None for media in self._medias]
+
+        features = self._features[:n].astype(np.float64)
+        votes = self._votes[:n]
+        voted = ~np.isnan(votes)
+        liked = voted.all(axis=1) & (np.nan_to_num(votes).mean(axis=1) >= LIKED_THRESHOLD)
+
+        # Per-person sum of vote * features and number of votes, i.e. the unnormalized taste profiles
+        self._profile_sums = np.nan_to_num(votes).T.astype(np.float64) @ features
+        self._vote_counts = voted.sum(axis=0).astype(np.int64)
+        # Sum of the features of the highly rated titles
+        self._liked_sum = features[liked].sum(axis=0)
+        # Candidate scores, recomputed lazily after each update
+        self._scores: Optional[np.ndarray] = None
+
+        # Rows of every saga/show, a later episode/season is not a candidate until the previous ones are viewed
+        self._chains: dict[tuple[str, str], set[int]] = defaultdict(set)
+        self._chain_keys: dict[int, tuple[str, str]] = {}
+
+        for row, media in enumerate(self._medias):
+            key = get_chain_key(media)
+            if key is not None:
+                self._chains[key].add(row)
+                self._chain_keys[row] = key
+
+        for key in self._chains:
+            self._update_chain_candidates(key)
+
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._medias)
+
+    def _grow(self):
+        extra = len(self._features)
+
+        self._features = np.vstack([self._features, np.zeros((extra, FEATURES), dtype=np.float32)])
+        self._votes = np.vstack([self._votes, np.full((extra, len(PEOPLE)), np.nan, dtype=np.float32)])
+        self._candidates = np.concatenate([self._candidates, np.zeros(extra, dtype=bool)])
+
+    def _contribution(self, row: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        votes = self._votes[row]
+        voted = ~np.isnan(votes)
+        features = self._features[row]
+
+        profile = np.outer(np.where(voted, votes, 0.0), features)
+        liked = features if voted.all() and votes.mean() >= LIKED_THRESHOLD else np.zeros(FEATURES)
+
+        return profile, voted.astype(np.int64), liked
+
+    def _update_chain_candidates(self, key: tuple[str, str]):
+        rows = sorted(self._chains[key], key=lambda r: (get_chain_order(self._medias[r]), self._medias[r].name))
+        pending = False
+
+        for row in rows:
+            media = self._medias[row]
+            self._candidates[row] = not pending and not media.viewed and media.scheduled_on is None
+            pending = pending or not media.viewed
+
+    def _upsert(self, media: Media) -> set[tuple[str, str]]:
+        """Update the row of the media, returning the chains whose candidates have to be recomputed."""
+        row = self._rows.get(media.id)
+
+        if row is None:
+            row = len(self._medias)
+            if row == len(self._features):
+                self._grow()
+
+            self._rows[media.id] = row
+            self._medias.append(media)
+            self._features[row] = features_matrix([media])[0]
+        else:
+            profile, counts, liked = self._contribution(row)
+            self._profile_sums -= profile
+            self._vote_counts -= counts
+            self._liked_sum -= liked
+
+            if media.tmdb != self._medias[row].tmdb:
+                self._features[row] = features_matrix([media])[0]
+            self._medias[row] = media
+
+        self._votes[row] = votes_matrix([media])[0]
+        self._candidates[row] = not media.viewed and media.scheduled_on is None
+
+        profile, counts, liked = self._contribution(row)
+        self._profile_sums += profile
+        self._vote_counts += counts
+        self._liked_sum += liked
+
+        changed_chains = set()
+        old_key = self._chain_keys.pop(row, None)
+        if old_key is not None:
+            self._chains[old_key].discard(row)
+            changed_chains.add(old_key)
+
+        key = get_chain_key(media)
+        if key is not None:
+            self._chains[key].add(row)
+            self._chain_keys[row] = key
+            changed_chains.add(key)
+
+        return changed_chains
+
+    def update(self, medias: Iterable[Media]):
+        with self._lock:
+            changed_chains = set()
+
+            for media in medias:
+                changed_chains |= self._upsert(media)
+
+            for key in changed_chains:
+                self._update_chain_candidates(key)
+
+            self._scores = None
+
+    def scores(self) -> np.ndarray:
+        n = len(self._medias)
+        features = self._features[:n]
+        votes = self._votes[:n]
+
+        profiles = self._profile_sums / np.maximum(self._vote_counts, 1)[:, None]
+        # Per-person affinity, blending the average with the least satisfied member so nobody is left out
+        affinity = features @ profiles.T.astype(np.float32)
+        group_affinity = (affinity.mean(axis=1) + affinity.min(axis=1)) / 2
+
+        liked_norm = np.linalg.norm(self._liked_sum)
+        if liked_norm > 0:
+            similarity = features @ (self._liked_sum / liked_norm).astype(np.float32)
+        else:
+            similarity = np.zeros(n, dtype=np.float32)
+
+        complete = ~np.isnan(votes).any(axis=1)
+        votes_avg = np.where(complete, np.nan_to_num(votes).mean(axis=1), 0.0)
+
+        return VOTES_WEIGHT * votes_avg + AFFINITY_WEIGHT * group_affinity + SIMILARITY_WEIGHT * similarity
+
+    def recommend(self, k: int = 10) -> list[Recommendation]:
+        with self._lock:
+            n = len(self._medias)
+            if self._scores is None:
+                self._scores = np.where(self._candidates[:n], self.scores(), -np.inf)
+
+            scores = self._scores
+            candidates = int(self._candidates[:n].sum())
+            k = min(k, candidates)
+
+            if k <= 0:
+                return []
+
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [Recommendation(media=self._medias[row], score=float(scores[row])) for row in top]
+
+
+_recommender: Optional[Recommender] = None
+_recommender_lock = threading.Lock()
+# Writes seen while a rebuild is running, replayed on the new recommender since it may have read the backlog before them
+_pending_writes: Optional[list[Media]] = None
+
+
+def build_recommender() -> Recommender:
+    logger.debug('Building recommender...')
+
+    return Recommender([*get_medias(media_type='movie'), *get_medias(media_type='show')])
+
+
+def rebuild_recommender():
+    global _recommender, _pending_writes
+
+    try:
+        recommender = build_recommender()
+
+        with _recommender_lock:
+            recommender.update(_pending_writes)
+            _recommender = recommender
+    finally:
+        with _recommender_lock:
+            _pending_writes = None
+
+
+def get_recommender() -> Recommender:
+    """The first call builds the recommender, a stale one keeps serving while its replacement is built aside."""
+    global _recommender, _pending_writes
+
+    with _recommender_lock:
+        if _recommender is None:
+            _recommender = build_recommender()
+        elif _pending_writes is None and time.monotonic() - _recommender.built_at > REBUILD_TTL:
+            _pending_writes = []
+            threading.Thread(target=rebuild_recommender, name='recommender-rebuild', daemon=True).start()
+
+        return _recommender
+
+
+@on_backlog_write
+def update_recommender(medias: Iterable[Media]):
+    medias = list(medias)
+
+    with _recommender_lock:
+        if _recommender is not None:
+            _recommender.update(medias)
+        if _pending_writes is not None:
+            _pending_writes.extend(medias)
+
+
+def recommend(k: int = 10) -> list[Recommendation]:
+    return get_recommender().recommend(k=k)
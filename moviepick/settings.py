@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class MongoSettings(BaseSettings):
@@ -9,5 +11,8 @@ class MongoSettings(BaseSettings):
 class TMDBSettings(BaseSettings):
     TOKEN: str
 
+class CatalogSettings(BaseSettings):
+    CATALOG_PATH: Optional[str] = None
+
 
 PEOPLE = ['eiryuu', 'jac', 'plue', 'wasp']
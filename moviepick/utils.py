@@ -1,18 +1,20 @@
 import time
 import urllib.parse
-from typing import Generator, Literal, Iterable, Any, Type, Optional
+from typing import Generator, Literal, Iterable, Any, Type, Optional, Callable
 
 import pandas as pd
 import requests
 from bson import ObjectId
 from loguru import logger
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from pymongo import MongoClient
 from pymongo.synchronous.collection import Collection
 from pymongo.synchronous.database import Database
 import streamlit as st
 
-from models import Media, media_factory, AbstractMedia, Vote, TMDBSearchResult, TMDBMovie, TMDBShow
+from catalog import search_catalog
+from models import Media, media_factory, AbstractMedia, Vote, TMDBSearchResult, TMDBMovie, TMDBShow, CatalogEntry, \
+    TMDBMetadata
 from settings import MongoSettings, PEOPLE, TMDBSettings
 
 
@@ -34,6 +36,9 @@ def render_sidebar():
     with st.sidebar:
         st.page_link(page='voting.py', label='Vota')
         st.page_link(page='pages/backlog.py', label='Backlog')
+        st.page_link(page='pages/recommendations.py', label='Consigli')
+        st.page_link(page='pages/planner.py', label='Pianifica')
+        st.page_link(page='pages/analytics.py', label='Statistiche')
 
 
 def get_medias(media_type: Literal['movie', 'show']) -> Generator[Media, None, None]:
@@ -105,12 +110,22 @@ def get_medias_df(medias: Iterable[Media], filters: dict[str, str], reference_mo
     return df
 
 
-def save_data(data: pd.DataFrame):
-    logger.debug('Saving data...')
-    db = get_mongo_db(connection_string=MongoSettings().CONNECTION_STRING, db_name=MongoSettings().DATABASE)
-    collection = get_mongo_collection(db=db, collection_name=MongoSettings().BACKLOG_COLLECTION)
+_backlog_write_hooks: list[Callable[[list[Media]], None]] = []
+
+
+def on_backlog_write(hook: Callable[[list[Media]], None]) -> Callable[[list[Media]], None]:
+    _backlog_write_hooks.append(hook)
+
+    return hook
 
-    changes = st.session_state.edited_data
+
+def notify_backlog_write(medias: list[Media]):
+    for hook in _backlog_write_hooks:
+        hook(medias)
+
+
+def apply_changes(collection: Collection, data: pd.DataFrame, changes: dict[str, Any]) -> list[Media]:
+    written = []
 
     for idx, update in changes['edited_rows'].items():
         row = dict(data.iloc[idx])
@@ -136,10 +151,74 @@ def save_data(data: pd.DataFrame):
 
         collection.update_one(filter={'_id': ObjectId(updated_media.id)},
                               update={'$set': updated_media.model_dump(exclude={'id'}, mode='json')})
+        written.append(updated_media)
 
     for new_raw_media in changes['added_rows']:
         media = media_factory(new_raw_media)
-        collection.insert_one(media.model_dump(exclude={'id'}))
+        result = collection.insert_one(media.model_dump(exclude={'id'}))
+        written.append(media.model_copy(update={'id': str(result.inserted_id)}))
+
+    return written
+
+
+def save_data(data: pd.DataFrame):
+    logger.debug('Saving data...')
+    db = get_mongo_db(connection_string=MongoSettings().CONNECTION_STRING, db_name=MongoSettings().DATABASE)
+    collection = get_mongo_collection(db=db, collection_name=MongoSettings().BACKLOG_COLLECTION)
+
+    written = apply_changes(collection=collection, data=data, changes=st.session_state.edited_data)
+
+    notify_backlog_write(written)
+
+
+def add_media(media: Media) -> Media:
+    db = get_mongo_db(connection_string=MongoSettings().CONNECTION_STRING, db_name=MongoSettings().DATABASE)
+    collection = get_mongo_collection(db=db, collection_name=MongoSettings().BACKLOG_COLLECTION)
+
+    result = collection.insert_one(media.model_dump(exclude={'id'}, mode='json'))
+    added = media.model_copy(update={'id': str(result.inserted_id)})
+
+    notify_backlog_write([added])
+
+    return added
+
+
+def get_tmdb_metadata(tmdb_media: TMDBMovie | TMDBShow) -> TMDBMetadata:
+    return TMDBMetadata(**tmdb_media.model_dump(include=set(TMDBMetadata.model_fields)))
+
+
+def backfill_tmdb_metadata() -> int:
+    """Fill the TMDB metadata of the backlog entries added without it, using the best search result by name."""
+    db = get_mongo_db(connection_string=MongoSettings().CONNECTION_STRING, db_name=MongoSettings().DATABASE)
+    collection = get_mongo_collection(db=db, collection_name=MongoSettings().BACKLOG_COLLECTION)
+
+    tmdb_types = {'movie': 'movie', 'show': 'tv'}
+    updated = []
+
+    try:
+        for raw_media in collection.find({'tmdb': None}):
+            media = media_factory(raw_media)
+
+            try:
+                result = search_media_paged(query=media.name, page=1, type=tmdb_types[media.type])
+            except (requests.HTTPError, ValidationError) as e:
+                logger.warning(f'No TMDB metadata for {media.name}: {e}')
+                continue
+
+            if not result.results:
+                logger.warning(f'No TMDB match for {media.name}')
+                continue
+
+            tmdb = get_tmdb_metadata(result.results[0])
+            collection.update_one(filter={'_id': ObjectId(media.id)},
+                                  update={'$set': {'tmdb': tmdb.model_dump(mode='json')}})
+            updated.append(media.model_copy(update={'tmdb': tmdb}))
+
+            time.sleep(0.1)
+    finally:
+        notify_backlog_write(updated)
+
+    return len(updated)
 
 
 def search_media_paged(query: str, page: int, type: Literal['movie', 'tv']) -> TMDBSearchResult:
@@ -158,7 +237,35 @@ def search_media_paged(query: str, page: int, type: Literal['movie', 'tv']) -> T
     return search_result
 
 
-def search_media(query: str, type: Literal['movie', 'tv']) -> list[TMDBMovie | TMDBShow]:
+def get_media_details(id: int, type: Literal['movie', 'tv']) -> TMDBMovie | TMDBShow:
+    url = f"https://api.themoviedb.org/3/{type}/{id}?language=it-IT"
+
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {TMDBSettings().TOKEN}"}
+
+    response = requests.get(url, headers=headers)
+    response.raise_for_status()
+
+    raw_media = response.json()
+    # Details list the genres as objects, search results only by id
+    raw_media['genre_ids'] = [genre['id'] for genre in raw_media.pop('genres', [])]
+
+    return TMDBMovie(**raw_media) if type == 'movie' else TMDBShow(**raw_media)
+
+
+def resolve_catalog_entry(media: TMDBMovie | TMDBShow | CatalogEntry) -> TMDBMovie | TMDBShow:
+    """Catalog entries only know the original title, fetch the localized details of the chosen one."""
+    if isinstance(media, CatalogEntry):
+        return get_media_details(id=media.id, type=media.type)
+
+    return media
+
+
+def search_media(query: str, type: Literal['movie', 'tv']) -> list[TMDBMovie | TMDBShow | CatalogEntry]:
+    if catalog_medias := search_catalog(query=query, type=type):
+        return catalog_medias
+
     result = search_media_paged(query=query, page=1, type=type)
     medias = result.results
 
@@ -171,9 +278,9 @@ def search_media(query: str, type: Literal['movie', 'tv']) -> list[TMDBMovie | T
     return medias
 
 
-def search_movie(query: str) -> list[TMDBMovie]:
+def search_movie(query: str) -> list[TMDBMovie | CatalogEntry]:
     return search_media(query=query, type='movie')
 
 
-def search_show(query: str) -> list[TMDBShow]:
+def search_show(query: str) -> list[TMDBShow | CatalogEntry]:
     return search_media(query=query, type='tv')
@@ -7,14 +7,20 @@ import streamlit as st
 from streamlit_server_state import server_state, server_state_lock
 
 from models import Media, AbstractMedia
+from planner import get_blocked_media_ids
 from utils import render_sidebar, get_medias, vote_to_label, get_mongo_db, get_mongo_collection
 from settings import PEOPLE, MongoSettings
 
 
 def get_medias_df(medias: Iterable[Media], types_filter: Optional[list[str]]) -> pd.DataFrame:
     serialized = []
+    medias = list(medias)
+    blocked = get_blocked_media_ids(medias)
 
     for media in medias:
+        if media.id in blocked:
+            continue
+
         result = media.model_dump()
 
         for vote in media.votes:
@@ -85,7 +91,7 @@ with col_1_1:
     type_filter = st.pills(label='Type', options=['movie', 'show'], selection_mode="multi")
 
 if 'restricted_data' not in server_state:
-    medias = get_medias()
+    medias = [*get_medias(media_type='movie'), *get_medias(media_type='show')]
     data = get_medias_df(medias=medias, types_filter=type_filter)
 else:
     data = server_state['restricted_data']